@@ -1,8 +1,11 @@
 import sys
 import os
+import re
 import json
+import queue
 import logging
 import shutil
+import threading
 import time
 from datetime import datetime
 
@@ -12,14 +15,24 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QH
                              QTabWidget, QLineEdit, QRadioButton, QButtonGroup, QPushButton, QComboBox,
                              QLabel, QTableWidget, QTableWidgetItem, QTextEdit, QFileDialog, QMessageBox,
                              QHeaderView, QDialog, QDialogButtonBox, QStyle, QProgressBar, QAction)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QFont, QIcon
 
 from yt_dlp import YoutubeDL
+from yt_dlp.utils import determine_ext
 
 # Versão atual do aplicativo (definida como 0.0.3)
 CURRENT_VERSION = "0.0.3"
 
+# Opções de resolução padrão e altura máxima (em pixels) de cada uma
+RESOLUTION_CHOICES = ["Melhor Qualidade", "8K", "4K", "1080p", "720p", "360p"]
+RESOLUTION_HEIGHTS = {"8K": 4320, "4K": 2160}
+
+# Metadados ficam válidos por 30 minutos (os links de mídia do yt_dlp expiram)
+METADATA_TTL = 30 * 60
+METADATA_MAX_ENTRIES = 100
+METADATA_WORKERS = 2
+
 # -----------------------------------------------------------------------------
 # Função para buscar atualizações automaticamente (comentada para uso futuro)
 # -----------------------------------------------------------------------------
@@ -63,6 +76,181 @@ class DownloadItem:
         self.added_at = datetime.now().strftime("%H:%M:%S %d/%m")
         self.cancelled = False
         self.file_path = ""  # Armazena o caminho do arquivo baixado
+        self.media_key = None  # (extrator, id do vídeo), preenchido pelos metadados
+        self.details = ""    # Duração, tamanho estimado e resoluções (tooltip do título)
+
+# -----------------------------------------------------------------------------
+# Funções auxiliares de URL, resolução e metadados
+# -----------------------------------------------------------------------------
+def normalize_url(url: str) -> str:
+    # Posts do Instagram são baixados como Reels
+    if "instagram.com" in url.lower() and "/p/" in url.lower() and "/reel/" not in url.lower():
+        return url.replace("/p/", "/reel/")
+    return url
+
+def resolution_label(height: int) -> str:
+    for label, h in RESOLUTION_HEIGHTS.items():
+        if h == height:
+            return label
+    return f"{height}p"
+
+def resolution_height(label: str):
+    if label in RESOLUTION_HEIGHTS:
+        return RESOLUTION_HEIGHTS[label]
+    match = re.fullmatch(r"(\d+)p", label)
+    return int(match.group(1)) if match else None  # None = "Melhor Qualidade"
+
+def video_format(resolution_choice: str) -> str:
+    height = resolution_height(resolution_choice)
+    if height is None:
+        return "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]"
+    return (f"bestvideo[height<={height}][ext=mp4]+bestaudio[ext=m4a]"
+            f"/best[height<={height}][ext=mp4]")
+
+def _formats(info: dict) -> list:
+    # O resultado cru (process=False) ainda não passou pela normalização do
+    # yt_dlp, então `ext` pode faltar; ele é deduzido da URL como o yt_dlp faria.
+    # `height` e `vcodec` não podem ser deduzidos: extratores que não os informam
+    # ficam sem lista de resoluções e sem estimativa de tamanho. Resultados do
+    # tipo 'url'/'url_transparent' (links curtos e redirecionadores) não têm
+    # formatos e o MetadataThread os resolve um nível antes de guardá-los.
+    formats = []
+    for f in info.get('formats') or []:
+        if not f.get('ext') and f.get('url'):
+            f = dict(f, ext=determine_ext(f['url']))
+        formats.append(f)
+    return formats
+
+def _video_formats(info: dict) -> list:
+    return [f for f in _formats(info)
+            if f.get('height') and f.get('vcodec') != 'none']
+
+def available_heights(info: dict) -> list:
+    # Prefere as alturas em MP4, que são as usadas pelo seletor de formato
+    formats = _video_formats(info)
+    mp4 = [f for f in formats if f.get('ext') == 'mp4']
+    return sorted({f['height'] for f in (mp4 or formats)}, reverse=True)
+
+def _format_size(fmt: dict, duration):
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if not size and fmt.get('tbr') and duration:
+        size = fmt['tbr'] * 1000 / 8 * duration
+    return size or 0
+
+def estimate_size(info: dict, format_choice: str, resolution_choice: str):
+    duration = info.get('duration')
+    if format_choice.upper() == "MÚSICA - MP3":
+        # O MP3 final é gerado a 192 kbps pelo FFmpeg
+        return duration * 192000 / 8 if duration else None
+    height = resolution_height(resolution_choice)
+    videos = [f for f in _video_formats(info) if f.get('ext') == 'mp4'
+              and (height is None or f['height'] <= height)]
+    if not videos:
+        return None
+    video = max(videos, key=lambda f: (f['height'], f.get('tbr') or 0))
+    size = _format_size(video, duration)
+    if video.get('acodec') == 'none':
+        audios = [f for f in _formats(info)
+                  if f.get('ext') == 'm4a' and f.get('vcodec') == 'none']
+        if audios:
+            audio = max(audios, key=lambda f: f.get('abr') or f.get('tbr') or 0)
+            size += _format_size(audio, duration)
+    return size or None
+
+def human_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+def human_duration(seconds) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+# -----------------------------------------------------------------------------
+# Cache de metadados com validade (TTL), compartilhado entre as threads
+# -----------------------------------------------------------------------------
+class MetadataCache:
+    def __init__(self, ttl: float = METADATA_TTL, max_entries: int = METADATA_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}    # {url: (expira_em, info)}
+        self._pending = set() # URLs sendo resolvidas pelos workers
+        self._lock = threading.Lock()
+
+    def get(self, url: str):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[url]
+                return None
+            return entry[1]
+
+    def mark_pending(self, url: str) -> bool:
+        # Retorna False se a URL já está no cache ou na fila de resolução
+        with self._lock:
+            if url in self._pending:
+                return False
+            entry = self._entries.get(url)
+            if entry and entry[0] >= time.monotonic():
+                return False
+            self._pending.add(url)
+            return True
+
+    def put(self, url: str, info):
+        with self._lock:
+            self._pending.discard(url)
+            if info is not None:
+                now = time.monotonic()
+                self._entries[url] = (now + self.ttl, info)
+                for key in [k for k, (exp, _) in self._entries.items() if exp < now]:
+                    del self._entries[key]
+                while len(self._entries) > self.max_entries:
+                    oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                    del self._entries[oldest]
+
+# -----------------------------------------------------------------------------
+# Thread leve que resolve metadados (título, duração, resoluções) sem baixar
+# -----------------------------------------------------------------------------
+class MetadataThread(QThread):
+    metadata_signal = pyqtSignal(str, object)  # url, info
+    error_signal = pyqtSignal(str, str)        # url, mensagem de erro
+
+    def __init__(self, url_queue: queue.Queue, cache: MetadataCache):
+        super().__init__()
+        self.url_queue = url_queue
+        self.cache = cache
+
+    def run(self):
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            'nocheckcertificate': True,
+            'socket_timeout': 15,
+        }
+        with YoutubeDL(ydl_opts) as ydl:
+            while True:
+                url = self.url_queue.get()
+                if url is None:
+                    break
+                try:
+                    # process=False: só o extrator roda, sem seleção de formatos
+                    info = ydl.extract_info(url, download=False, process=False)
+                    if info.get('_type') in ('url', 'url_transparent'):
+                        info = ydl.extract_info(info['url'], ie_key=info.get('ie_key'),
+                                                download=False, process=False)
+                except Exception as e:
+                    # O log é feito na thread da interface (LogHandler escreve num QTextEdit)
+                    self.cache.put(url, None)
+                    self.error_signal.emit(url, str(e))
+                    continue
+                self.cache.put(url, info)
+                self.metadata_signal.emit(url, info)
 
 # -----------------------------------------------------------------------------
 # Thread para realizar o download usando yt_dlp
@@ -70,6 +258,7 @@ class DownloadItem:
 class DownloadThread(QThread):
     progress_signal = pyqtSignal(str, float, str)  # id, progresso, status
     finished_signal = pyqtSignal(str)              # id
+    metadata_signal = pyqtSignal(str, object)      # url, info cru do extrator
 
     def __init__(self, download_item: DownloadItem, download_folder: str):
         super().__init__()
@@ -111,20 +300,19 @@ class DownloadThread(QThread):
                 'preferredquality': '192',
             }]
         else:
-            ydl_opts['format'] = {
-                "Melhor Qualidade": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]",
-                "8K": "bestvideo[height<=4320][ext=mp4]+bestaudio[ext=m4a]/best[height<=4320][ext=mp4]",
-                "4K": "bestvideo[height<=2160][ext=mp4]+bestaudio[ext=m4a]/best[height<=2160][ext=mp4]",
-                "1080p": "bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[height<=1080][ext=mp4]",
-                "720p": "bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]",
-                "360p": "bestvideo[height<=360][ext=mp4]+bestaudio[ext=m4a]/best[height<=360][ext=mp4]"
-            }.get(self.item.resolution_choice, "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]")
+            ydl_opts['format'] = video_format(self.item.resolution_choice)
         try:
             with YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(self.item.url, download=False)
+                # Extrai e baixa na mesma instância (mesmos cookies e mesma
+                # thread); o resultado cru vai para o cache de metadados da UI.
+                # Os formatos são copiados porque process_ie_result os altera.
+                info = ydl.extract_info(self.item.url, download=False, process=False)
+                formats = [dict(f) for f in info.get('formats') or []]
+                self.metadata_signal.emit(self.item.url, dict(info, formats=formats))
                 self.item.title = info.get('title', 'Unknown Title')
                 self.progress_signal.emit(self.item.id, 0, "Baixando")
-                ydl.download([self.item.url])
+                info = ydl.process_ie_result(info, download=True)
+                self.item.title = info.get('title', self.item.title)
                 filename = ydl.prepare_filename(info)
                 ext = "mp3" if self.item.format_choice.upper() == "MÚSICA - MP3" else "mp4"
                 final_file = filename.rsplit(".", 1)[0] + f".{ext}"
@@ -203,6 +391,16 @@ class DownloadApp(QMainWindow):
             os.makedirs("temp_downloads")
         self.downloads = {}   # {id: DownloadItem}
         self.threads = {}     # {id: DownloadThread}
+        self.typed_url = ""   # URL normalizada do campo de link
+        self.metadata_cache = MetadataCache()
+        self.metadata_queue = queue.Queue()
+        self.metadata_threads = []
+        for _ in range(METADATA_WORKERS):
+            worker = MetadataThread(self.metadata_queue, self.metadata_cache)
+            worker.metadata_signal.connect(self.metadata_ready)
+            worker.error_signal.connect(self.metadata_failed)
+            worker.start()
+            self.metadata_threads.append(worker)
         self.init_ui()
         self.setup_logging()
         self.apply_dark_theme()  # Inicia com tema Escuro
@@ -252,6 +450,12 @@ class DownloadApp(QMainWindow):
         self.url_edit = QLineEdit()
         self.url_edit.setPlaceholderText("Insira a URL do vídeo...")
         form_layout.addRow("Link do Vídeo:", self.url_edit)
+        # Busca os metadados do link digitado após uma pausa na digitação
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(600)
+        self.prefetch_timer.timeout.connect(self.prefetch_url_edit)
+        self.url_edit.textChanged.connect(self.url_changed)
 
         self.format_group = QButtonGroup()
         h_format = QHBoxLayout()
@@ -265,7 +469,7 @@ class DownloadApp(QMainWindow):
         form_layout.addRow("Formato:", h_format)
 
         self.resolution_combo = QComboBox()
-        self.resolution_combo.addItems(["Melhor Qualidade", "8K", "4K", "1080p", "720p", "360p"])
+        self.resolution_combo.addItems(RESOLUTION_CHOICES)
         form_layout.addRow("Resolução:", self.resolution_combo)
         layout.addLayout(form_layout)
 
@@ -341,6 +545,51 @@ class DownloadApp(QMainWindow):
         config_widget.setLayout(layout)
         self.tabs.addTab(config_widget, "Configurações")
 
+    def url_changed(self):
+        url = normalize_url(self.url_edit.text().strip())
+        if url == self.typed_url:
+            return
+        self.typed_url = url
+        self.set_resolution_choices(RESOLUTION_CHOICES)
+        self.prefetch_timer.start()
+
+    def prefetch_url_edit(self):
+        if not self.typed_url.lower().startswith(("http://", "https://")):
+            return
+        self.prefetch(self.typed_url)
+
+    def show_cached(self, url: str) -> bool:
+        info = self.metadata_cache.get(url)
+        if info is None:
+            return False
+        self.metadata_ready(url, info)
+        return True
+
+    def prefetch(self, url: str):
+        if not self.show_cached(url) and self.metadata_cache.mark_pending(url):
+            self.metadata_queue.put(url)
+
+    def set_resolution_choices(self, choices: list):
+        current = self.resolution_combo.currentText()
+        if [self.resolution_combo.itemText(i) for i in range(self.resolution_combo.count())] == choices:
+            return
+        self.resolution_combo.clear()
+        self.resolution_combo.addItems(choices)
+        if current in choices:
+            self.resolution_combo.setCurrentText(current)
+            return
+        # Mantém a resolução mais próxima que não passe da escolhida pelo usuário
+        heights = [resolution_height(c) for c in choices if resolution_height(c)]
+        below = [h for h in heights if h <= (resolution_height(current) or 0)]
+        if below:
+            choice = resolution_label(max(below))
+        elif heights:
+            choice = resolution_label(min(heights))
+        else:
+            choice = choices[0]
+        self.resolution_combo.setCurrentText(choice)
+        logging.info(f"Resolução {current} indisponível; selecionada {choice}.")
+
     def toggle_resolution(self):
         if self.radio_mp3.isChecked():
             self.resolution_combo.setEnabled(False)
@@ -510,15 +759,16 @@ class DownloadApp(QMainWindow):
             return
         fmt = "Vídeo - MP4" if self.radio_mp4.isChecked() else "Música - MP3"
         resolution = self.resolution_combo.currentText()
-        if "instagram.com" in url.lower() and "/p/" in url.lower() and "/reel/" not in url.lower():
-            url = url.replace("/p/", "/reel/")
+        normalized = normalize_url(url)
+        if normalized != url:
+            url = normalized
             logging.info("Link de Instagram convertido para Reels.")
         item = DownloadItem(url, fmt, resolution)
         self.downloads[item.id] = item
 
         row = self.table.rowCount()
         self.table.insertRow(row)
-        self.table.setItem(row, 0, QTableWidgetItem(item.title))
+        self.table.setItem(row, 0, self.title_cell(item))
         self.table.setItem(row, 1, QTableWidgetItem(item.format_choice))
         self.table.setItem(row, 2, QTableWidgetItem(item.resolution_choice))
         progress_bar = QProgressBar()
@@ -535,9 +785,13 @@ class DownloadApp(QMainWindow):
         self.table.setCellWidget(row, 6, btn_open)
         self.table.setRowHeight(row, 40)
 
+        # Sem busca de metadados separada: o próprio download extrai e envia o resultado
+        self.show_cached(url)
+
         thread = DownloadThread(item, self.download_folder)
         thread.progress_signal.connect(self.update_download)
         thread.finished_signal.connect(self.download_finished)
+        thread.metadata_signal.connect(self.download_metadata)
         self.threads[item.id] = thread
         thread.start()
 
@@ -554,7 +808,7 @@ class DownloadApp(QMainWindow):
         for row in range(self.table.rowCount()):
             cell = self.table.item(row, 5)
             if cell and cell.text() == item.added_at:
-                self.table.setItem(row, 0, QTableWidgetItem(item.title))
+                self.table.setItem(row, 0, self.title_cell(item))
                 prog_widget = self.table.cellWidget(row, 3)
                 if prog_widget:
                     if status == "Processando":
@@ -571,6 +825,63 @@ class DownloadApp(QMainWindow):
                     btn_open.setEnabled(False)
                 break
 
+    def title_cell(self, item: DownloadItem) -> QTableWidgetItem:
+        cell = QTableWidgetItem(item.title)
+        cell.setToolTip(item.details)
+        return cell
+
+    @pyqtSlot(str, object)
+    def download_metadata(self, url: str, info):
+        if info.get('_type') in ('url', 'url_transparent'):
+            # Redirecionador: o MetadataThread resolve o link final para a prévia
+            self.prefetch(url)
+            return
+        self.metadata_cache.put(url, info)
+        self.metadata_ready(url, info)
+
+    @pyqtSlot(str, str)
+    def metadata_failed(self, url: str, error: str):
+        # Falhas de links ainda sendo digitados não vão para o log
+        if any(item.url == url for item in self.downloads.values()):
+            logging.warning(f"Não foi possível obter metadados de {url}: {error}")
+
+    @pyqtSlot(str, object)
+    def metadata_ready(self, url: str, info):
+        heights = available_heights(info)
+        if heights and self.typed_url == url:
+            self.set_resolution_choices(["Melhor Qualidade"] + [resolution_label(h) for h in heights])
+        for item in self.downloads.values():
+            if item.url != url:
+                continue
+            if item.status in ("Na fila", "Baixando"):
+                item.title = info.get('title', item.title)
+            details = []
+            if info.get('duration'):
+                details.append(f"Duração: {human_duration(info['duration'])}")
+            size = estimate_size(info, item.format_choice, item.resolution_choice)
+            if size:
+                details.append(f"Tamanho estimado: {human_size(size)}")
+            if heights:
+                details.append("Resoluções: " + ", ".join(resolution_label(h) for h in heights))
+            item.details = "\n".join(details)
+            for row in range(self.table.rowCount()):
+                cell = self.table.item(row, 5)
+                if cell and cell.text() == item.added_at:
+                    self.table.setItem(row, 0, self.title_cell(item))
+                    break
+            if item.media_key is None:
+                # Avisa uma única vez, quando o item recebe seus metadados
+                item.media_key = (info.get('extractor_key'), info.get('id') or info.get('webpage_url'))
+                self.warn_if_duplicate(item)
+
+    def warn_if_duplicate(self, item: DownloadItem):
+        # Compara pelo vídeo resolvido, não pelo texto da URL (youtu.be vs youtube.com)
+        for other in self.downloads.values():
+            if (other is not item and other.media_key == item.media_key
+                    and other.status in ("Na fila", "Baixando")):
+                logging.warning(f"O vídeo \"{item.title}\" já está na fila.")
+                return
+
     @pyqtSlot(str)
     def download_finished(self, download_id: str):
         logging.info(f"Download finalizado: {download_id}")
@@ -632,6 +943,7 @@ class DownloadApp(QMainWindow):
                     thread = DownloadThread(item, self.download_folder)
                     thread.progress_signal.connect(self.update_download)
                     thread.finished_signal.connect(self.download_finished)
+                    thread.metadata_signal.connect(self.download_metadata)
                     self.threads[item.id] = thread
                     thread.start()
                     logging.info(f"Reiniciando download: {item.url}")
@@ -654,6 +966,21 @@ class DownloadApp(QMainWindow):
                 logging.info(f"Download cancelado: {item.url}")
                 break
 
+    def closeEvent(self, event):
+        # Descarta as URLs ainda na fila para que os workers parem logo
+        while True:
+            try:
+                self.metadata_cache.put(self.metadata_queue.get_nowait(), None)
+            except queue.Empty:
+                break
+        for _ in self.metadata_threads:
+            self.metadata_queue.put(None)
+        # Cada extração é limitada pelo socket_timeout; a janela some enquanto espera
+        self.hide()
+        for worker in self.metadata_threads:
+            worker.wait()
+        super().closeEvent(event)
+
 # -----------------------------------------------------------------------------
 # Execução da Aplicação
 # -----------------------------------------------------------------------------